@@ -1,25 +1,45 @@
+import asyncio
 import fnmatch
-import json
+import functools
+import hashlib
+import io
 import os
+import re
+from dataclasses import dataclass
 from typing import (
     Any,
     Dict,
+    Iterable,
+    Iterator,
     List,
     Optional,
+    Pattern,
+    Tuple,
 )
 
+import httpx
+import orjson
+import requests
 from github import (
     Github,
     GithubException,
 )
+from github.PullRequest import PullRequest
 from pydantic import (
     BaseModel,
     Field,
 )
 from pydantic_ai import Agent
+from pydantic_ai.exceptions import ModelHTTPError
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.openai import OpenAIProvider
 from unidiff import PatchSet
+from unidiff.errors import UnidiffParseError
+
+from .prompts import (
+    reviewer_prompt,
+    user_inputs_template,
+)
 
 # Read environment variables
 github_token = (
@@ -34,10 +54,41 @@ api_key = (
 )
 base_url = os.environ.get("INPUT_BASE_URL") or os.environ.get("INPUT_BASE-URL")
 model_name = os.environ.get("INPUT_MODEL", "gpt-4o")
+models_spec = os.environ.get("INPUT_MODELS")
 language = os.environ.get("INPUT_LANGUAGE", "en")
 repo_full_name = os.environ.get("GITHUB_REPOSITORY")
 event_path = os.environ.get("GITHUB_EVENT_PATH")
 event_name = os.environ.get("GITHUB_EVENT_NAME")
+max_concurrent = int(
+    os.environ.get("INPUT_MAX_CONCURRENT") or
+    os.environ.get("INPUT_MAX-CONCURRENT") or
+    8
+)
+batch_tokens = int(
+    os.environ.get("INPUT_BATCH_TOKENS") or
+    os.environ.get("INPUT_BATCH-TOKENS") or
+    3000
+)
+use_http2 = (os.environ.get("INPUT_HTTP2") or "true").strip().lower() == "true"
+cache_dir = os.environ.get("INPUT_CACHE_DIR") or os.environ.get("INPUT_CACHE-DIR")
+
+_github_headers = {
+    'Authorization': f'Bearer {github_token}',
+    'Accept': 'application/vnd.github.v3.diff'
+}
+
+# Shared HTTP session so GitHub requests reuse keep-alive connections
+_session = requests.Session()
+_session.headers.update(_github_headers)
+
+# Review role used when a single model reviews everything
+DEFAULT_ROLE = "general"
+
+# Maximum number of inline comments posted in a single review
+REVIEW_CHUNK_SIZE = 50
+
+# Pull requests fetched via PyGithub, keyed by (repo_full_name, pull_number)
+_pull_cache: Dict[Tuple[str, int], PullRequest] = {}
 
 
 class PRDetails(BaseModel):
@@ -49,15 +100,30 @@ class PRDetails(BaseModel):
     description: Optional[str]
 
 
-class HunkContext(BaseModel):
-    """Context for a single diff hunk"""
+class BatchConfig(BaseModel):
+    """Concurrency, batching and retry settings for AI review calls"""
+    max_concurrent: int = Field(default=8, ge=1)
+    max_batch_tokens: int = Field(default=3000, ge=0)  # Estimated diff tokens packed into one AI call
+    retries: int = Field(default=3, ge=1)
+    timeout: float = Field(default=60, gt=0)  # Seconds per AI call
+
+
+@dataclass(slots=True)
+class HunkContext:
+    """Context for a single diff hunk (internal only, so no pydantic validation)"""
     file_path: str
     hunk_content: str
     start_position: int  # GitHub API position where this hunk starts
+    line_count: int  # Number of diff lines in the hunk, used to bounds-check review line numbers
 
 
 class ReviewItem(BaseModel):
     """Individual review comment"""
+    hunk_index: int = Field(
+        ...,
+        description="Index of the hunk this comment refers to, taken from its `## HUNK <index>` header (1-based)",
+        ge=1
+    )
     line_number: int = Field(
         ...,
         description="Line number relative to the hunk content (1-based)",
@@ -85,23 +151,93 @@ class ReviewResult(BaseModel):
     )
 
 
-def build_ai_agent(api_key: str, base_url: Optional[str], model_name: str) -> Agent[ReviewResult]:
+class ReviewCache:
+    """On-disk cache of AI review results for individual hunks"""
+
+    def __init__(self, cache_dir: str, model_name: str, language: str):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.language = language
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, hunk: HunkContext) -> str:
+        key = hashlib.sha256(f"{self.model_name}|{self.language}|{hunk.hunk_content}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, hunk: HunkContext) -> Optional[List[ReviewItem]]:
+        """Return cached review items for a hunk, or None on a cache miss"""
+        try:
+            with open(self._path(hunk), "r", encoding="utf-8") as f:
+                return ReviewResult.model_validate_json(f.read()).reviews
+        except (OSError, ValueError):
+            return None
+
+    def set(self, hunk: HunkContext, reviews: List[ReviewItem]) -> None:
+        """Store review items for a hunk"""
+        path = self._path(hunk)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(ReviewResult(reviews=reviews).model_dump_json())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: failed to write review cache: {e}")
+
+
+def build_ai_agent(
+    api_key: str,
+    base_url: Optional[str],
+    model_name: str,
+    http_client: Optional[httpx.AsyncClient] = None
+) -> Agent[ReviewResult]:
     """Build pydantic-ai agent for code review"""
-    provider = OpenAIProvider(api_key=api_key, base_url=base_url)
+    provider = OpenAIProvider(api_key=api_key, base_url=base_url, http_client=http_client)
     model = OpenAIModel(model_name, provider=provider)
     return Agent(model, output_type=ReviewResult)
 
 
+def parse_model_roles(models_spec: Optional[str], default_model: str) -> List[Tuple[str, str]]:
+    """Parse "role:model,role:model" into (role, model) pairs, falling back to the default model"""
+    model_roles = []
+    for entry in (models_spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        role, sep, model = entry.partition(":")
+        if not sep:
+            role, model = DEFAULT_ROLE, role
+        model_roles.append((role.strip() or DEFAULT_ROLE, model.strip() or default_model))
+
+    return model_roles or [(DEFAULT_ROLE, default_model)]
+
+
+def build_ai_agents(
+    api_key: str,
+    base_url: Optional[str],
+    model_roles: List[Tuple[str, str]],
+    http_client: Optional[httpx.AsyncClient] = None
+) -> List[Tuple[str, Agent[ReviewResult]]]:
+    """Build one pydantic-ai agent per review role"""
+    return [(role, build_ai_agent(api_key, base_url, model, http_client)) for role, model in model_roles]
+
+
 def load_event(path: str) -> Dict[str, Any]:
     """Load GitHub event data from file"""
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def get_pull(gh: Github, repo_full_name: str, pull_number: int) -> PullRequest:
+    """Fetch a pull request once and reuse it for later API calls"""
+    key = (repo_full_name, pull_number)
+    if key not in _pull_cache:
+        repo = gh.get_repo(repo_full_name)
+        _pull_cache[key] = repo.get_pull(pull_number)
+    return _pull_cache[key]
 
 
 def get_pr_details(gh: Github, repo_full_name: str, event: Dict[str, Any]) -> PRDetails:
     """Extract PR details from GitHub event"""
-    repo = gh.get_repo(repo_full_name)
-
     # Support both pull_request events and issue_comment events on PRs
     if "pull_request" in event:
         pr_number = event.get("number") or event["pull_request"]["number"]
@@ -110,7 +246,7 @@ def get_pr_details(gh: Github, repo_full_name: str, event: Dict[str, Any]) -> PR
     else:
         raise RuntimeError("This event is not for a pull request.")
 
-    pr = repo.get_pull(pr_number)
+    pr = get_pull(gh, repo_full_name, pr_number)
     owner, repo_name = repo_full_name.split("/")
 
     return PRDetails(
@@ -122,17 +258,51 @@ def get_pr_details(gh: Github, repo_full_name: str, event: Dict[str, Any]) -> PR
     )
 
 
-def get_pr_diff(gh: Github, pr_details: PRDetails) -> str:
-    """Fetch PR diff using GitHub API"""
-    import requests
+def get_pr_diff_url(pr_details: PRDetails) -> str:
+    """Build the GitHub API URL for a PR diff"""
+    return f"https://api.github.com/repos/{pr_details.owner}/{pr_details.repo}/pulls/{pr_details.pull_number}.diff"
+
+
+def iter_byte_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Re-split a stream of byte chunks into lines, keeping their newline endings"""
+    pending = b""
+    for chunk in chunks:
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            yield line + b"\n"
+    if pending:
+        yield pending
+
+
+def get_pr_diff(gh: Github, pr_details: PRDetails) -> PatchSet:
+    """Fetch PR diff using GitHub API, parsing it as it streams in"""
+    with _session.get(get_pr_diff_url(pr_details), stream=True) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to get diff. Status: {response.status_code}, Response: {response.text}")
+
+        # iter_content handles gzip/chunked bodies and simply stops at EOF
+        return PatchSet(iter_byte_lines(response.iter_content(chunk_size=64 * 1024)), encoding="utf-8")
+
 
-    api_url = f"https://api.github.com/repos/{pr_details.owner}/{pr_details.repo}/pulls/{pr_details.pull_number}"
-    headers = {
-        'Authorization': f'Bearer {github_token}',
-        'Accept': 'application/vnd.github.v3.diff'
-    }
+def build_github_client(**kwargs: Any) -> httpx.AsyncClient:
+    """Build the async HTTP/2 client for GitHub API requests"""
+    # Follow redirects (e.g. renamed or transferred repos) like the requests session does
+    return httpx.AsyncClient(http2=True, headers=_github_headers, timeout=30, follow_redirects=True, **kwargs)
 
-    response = requests.get(f"{api_url}.diff", headers=headers)
+
+async def get_pr_diff_async(client: httpx.AsyncClient, pr_details: PRDetails) -> PatchSet:
+    """Fetch PR diff using a shared async (HTTP/2) GitHub client"""
+    response = await client.get(get_pr_diff_url(pr_details))
+
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to get diff. Status: {response.status_code}, Response: {response.text}")
+
+    return PatchSet(io.BytesIO(response.content), encoding="utf-8")
+
+
+def get_pr_diff_text(gh: Github, pr_details: PRDetails) -> str:
+    """Fetch PR diff as plain text (used by the manual parsing fallback)"""
+    response = _session.get(get_pr_diff_url(pr_details))
 
     if response.status_code == 200:
         return response.text
@@ -140,20 +310,16 @@ def get_pr_diff(gh: Github, pr_details: PRDetails) -> str:
         raise RuntimeError(f"Failed to get diff. Status: {response.status_code}, Response: {response.text}")
 
 
-def parse_diff_with_positions(diff_text: str) -> List[HunkContext]:
-    """Parse diff using unidiff and calculate GitHub positions"""
+def parse_diff_with_positions(patch_set: PatchSet, exclude_re: Optional[Pattern[str]] = None) -> List[HunkContext]:
+    """Build hunk contexts from a parsed diff and calculate GitHub positions"""
     hunks_with_context = []
 
-    try:
-        patch_set = PatchSet(diff_text)
-    except Exception as e:
-        print(f"Error parsing diff with unidiff: {e}")
-        # Fallback to manual parsing if unidiff fails
-        return parse_diff_manual(diff_text)
-
     for patched_file in patch_set:
         if patched_file.path == "/dev/null" or not patched_file.path:
             continue
+        if exclude_re and exclude_re.match(patched_file.path):
+            print(f"Excluded file: {patched_file.path}")
+            continue
 
         # Track position in the entire file's diff
         position = 1
@@ -162,242 +328,548 @@ def parse_diff_with_positions(diff_text: str) -> List[HunkContext]:
             # Skip the @@ header line
             hunk_start_position = position + 1
 
-            # Build hunk content
-            hunk_lines = []
+            # Build hunk content (line values already carry their trailing newline)
+            buf = io.StringIO()
+            line_count = 0
             for line in hunk:
-                hunk_lines.append(f"{line.line_type}{line.value}")
+                buf.write(line.line_type)
+                buf.write(line.value)
+                line_count += 1
 
-            if hunk_lines:
+            if line_count:
                 hunks_with_context.append(
                     HunkContext(
                         file_path=patched_file.path,
-                        hunk_content="\n".join(hunk_lines),
-                        start_position=hunk_start_position
+                        hunk_content=buf.getvalue(),
+                        start_position=hunk_start_position,
+                        line_count=line_count
                     ))
 
             # Update position: header + content lines
-            position += 1 + len(hunk_lines)
+            position += 1 + line_count
 
     return hunks_with_context
 
 
-def parse_diff_manual(diff_text: str) -> List[HunkContext]:
-    """Manual diff parsing as fallback"""
-    hunks_with_context = []
-    lines = diff_text.splitlines()
-    current_file = None
+async def load_pr_hunks(
+    gh: Github,
+    pr_details: PRDetails,
+    exclude_re: Optional[Pattern[str]] = None
+) -> List[HunkContext]:
+    """Fetch the PR diff and parse it into hunks, falling back to manual parsing if unidiff fails"""
+    try:
+        if use_http2:
+            async with build_github_client() as client:
+                patch_set = await get_pr_diff_async(client, pr_details)
+        else:
+            patch_set = get_pr_diff(gh, pr_details)
+        # Excluded files are skipped while parsing, before any hunk content is built
+        return parse_diff_with_positions(patch_set, exclude_re)
+    except (UnidiffParseError, UnicodeDecodeError) as e:
+        # unidiff decodes strictly as UTF-8; the text fallback replaces undecodable bytes instead
+        print(f"Error parsing diff with unidiff: {e}")
+        # Fallback to manual parsing if unidiff fails
+        return parse_diff_manual(get_pr_diff_text(gh, pr_details), exclude_re)
+
+
+# Lines that delimit files and hunks in a unified diff
+_DIFF_HEADER_RE = re.compile(r"^(?:diff --git |--- |\+\+\+ |@@)", re.M)
+
+
+def _diff_header_path(path: str, prefix: str) -> Optional[str]:
+    """Strip the a/ or b/ prefix from a ---/+++ header path; None for /dev/null"""
+    path = path.rstrip("\r")
+    if path == "/dev/null":
+        return None
+    return path[len(prefix):] if path.startswith(prefix) else path
+
+
+def parse_diff_manual(diff_text: str, exclude_re: Optional[Pattern[str]] = None) -> List[HunkContext]:
+    """Manual diff parsing as fallback, scanning for file and hunk headers with a single regex"""
+    hunks_with_context: List[HunkContext] = []
+    current_file: Optional[str] = None
+    source_path: Optional[str] = None
+    target_path: Optional[str] = None
+    in_file_header = True
     position = 1
-    i = 0
+    hunk_start_position = 0
+    hunk_body_start: Optional[int] = None
+
+    def close_hunk(end: int) -> None:
+        nonlocal position, hunk_body_start
+        if hunk_body_start is None:
+            return
+        hunk_content = diff_text[hunk_body_start:end]
+        # The last line may lack a trailing newline at the end of the diff
+        line_count = hunk_content.count("\n") + (not hunk_content.endswith("\n")) if hunk_content else 0
+        if line_count and current_file:
+            hunks_with_context.append(
+                HunkContext(
+                    file_path=current_file,
+                    hunk_content=hunk_content,
+                    start_position=hunk_start_position,
+                    line_count=line_count
+                ))
+        # Update position: header + content lines
+        position += 1 + line_count
+        hunk_body_start = None
+
+    for match in _DIFF_HEADER_RE.finditer(diff_text):
+        header = match.group(0)
+        line_end = diff_text.find("\n", match.start())
+        if line_end == -1:
+            line_end = len(diff_text)
+
+        if header in ("--- ", "+++ "):
+            # Only file headers before the file's first hunk; otherwise removed/added lines
+            if in_file_header:
+                if header == "--- ":
+                    source_path = _diff_header_path(diff_text[match.end():line_end], "a/")
+                else:
+                    target_path = _diff_header_path(diff_text[match.end():line_end], "b/")
+            continue
 
-    while i < len(lines):
-        line = lines[i]
+        close_hunk(match.start())
 
-        # New file
-        if line.startswith('diff --git'):
-            current_file = None
+        if header == "diff --git ":
+            # New file
+            current_file = source_path = target_path = None
+            in_file_header = True
             position = 1
-        elif line.startswith('+++ b/'):
-            current_file = line[6:]
-        elif line.startswith('@@') and current_file:
-            # Found hunk header
+            continue
+
+        # Found hunk header; the first one ends the file header (even for excluded files)
+        if in_file_header:
+            in_file_header = False
+            # Deleted files only have a source path, like unidiff's PatchedFile.path
+            current_file = target_path or source_path
+            if current_file and exclude_re and exclude_re.match(current_file):
+                print(f"Excluded file: {current_file}")
+                current_file = None
+
+        if current_file:
+            # The @@ line itself takes one position
             hunk_start_position = position + 1
-            hunk_lines = []
-            i += 1
-            position += 1
+            hunk_body_start = line_end + 1
 
-            # Collect hunk content
-            while i < len(lines) and not lines[i].startswith('@@') and not lines[i].startswith('diff --git'):
-                hunk_lines.append(lines[i])
-                i += 1
-                position += 1
+    close_hunk(len(diff_text))
 
-            if hunk_lines:
-                hunks_with_context.append(
-                    HunkContext(
-                        file_path=current_file,
-                        hunk_content="\n".join(hunk_lines),
-                        start_position=hunk_start_position
-                    ))
-            continue
+    return hunks_with_context
 
-        i += 1
-        if current_file:  # Only increment position when we're in a file
-            position += 1
 
-    return hunks_with_context
+# The template is split around the diff so the per-PR part only has to be formatted once
+_USER_INPUTS_HEAD, _USER_INPUTS_TAIL = user_inputs_template.split("{git_diff}")
+
+
+@functools.lru_cache(maxsize=None)
+def _prompt_header(pr_title: str, pr_body: str) -> str:
+    """Build the static part of the prompt shared by every hunk of a PR"""
+    return reviewer_prompt + _USER_INPUTS_HEAD.format(pr_title=pr_title, pr_body=pr_body)
 
 
-def build_prompt(pr_details: PRDetails, hunk_context: HunkContext, language: str) -> str:
-    """Build review prompt using template from prompts.py"""
-    from .prompts import (
-        reviewer_prompt,
-        user_inputs_template,
+@functools.lru_cache(maxsize=None)
+def _language_footer(language: str, role: str) -> str:
+    """Build the output format instructions, with a focus line for specialised reviewers"""
+    focus = ""
+    if role != DEFAULT_ROLE:
+        focus = f"\n\n# FOCUS\nConcentrate on {role} issues; other reviewers cover the remaining areas.\n"
+    return focus + (
+        "\n\n# OUTPUT FORMAT\n"
+        "Return your analysis as a structured JSON matching the ReviewResult schema.\n"
+        "The diff is split into hunks, each introduced by a `## HUNK <index>: <file path>` header.\n"
+        "Set hunk_index to the hunk each review refers to and line_number relative to that hunk's content.\n"
+        f"Always respond in {language} language for the review comments.\n"
     )
 
-    # Format the prompt with context
-    prompt = reviewer_prompt + user_inputs_template.format(
-        pr_title=pr_details.title,
-        pr_body=pr_details.description or "No description provided",
-        git_diff=hunk_context.hunk_content
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of LLM tokens in a text (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def pack_hunks(hunks: List[HunkContext], max_tokens: int) -> List[List[HunkContext]]:
+    """Greedily group consecutive hunks so each group stays within the token budget"""
+    batches = []
+    current: List[HunkContext] = []
+    current_tokens = 0
+
+    for hunk in hunks:
+        tokens = estimate_tokens(hunk.hunk_content)
+        # A hunk larger than the budget still gets a batch of its own
+        if current and current_tokens + tokens > max_tokens:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(hunk)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def build_prompt(pr_details: PRDetails, hunks: List[HunkContext], language: str, role: str = DEFAULT_ROLE) -> str:
+    """Build review prompt for a batch of hunks using template from prompts.py"""
+    header = _prompt_header(pr_details.title, pr_details.description or "No description provided")
+    git_diff = "\n".join(
+        f"## HUNK {index}: {hunk.file_path}\n{hunk.hunk_content}" for index, hunk in enumerate(hunks, 1)
+    )
+    return header + git_diff + _USER_INPUTS_TAIL + _language_footer(language, role)
+
+
+def compile_exclude_patterns(exclude_patterns: List[str]) -> Optional[Pattern[str]]:
+    """Compile glob exclude patterns into a single regex"""
+    if not exclude_patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in exclude_patterns))
+
+
+# Full-line comment syntaxes, anchored so code after an inline block comment still counts as code
+_HASH_COMMENT = r"#"
+_SLASH_COMMENT = r"//"
+_DASH_COMMENT = r"--"
+_C_BLOCK_COMMENT = r"/\*(?:(?!\*/).)*(?:\*/\s*)?$|\*/\s*$"
+_HTML_COMMENT = r"<!--(?:(?!-->).)*(?:-->\s*)?$|-->\s*$"
+
+_COMMENT_SYNTAX_BY_EXTENSION = {
+    **dict.fromkeys(
+        [".py", ".pyi", ".sh", ".bash", ".zsh", ".rb", ".pl", ".r", ".yaml", ".yml", ".toml", ".tf", ".cmake"],
+        [_HASH_COMMENT]
+    ),
+    **dict.fromkeys(
+        [".c", ".h", ".cc", ".cpp", ".cxx", ".hpp", ".cs", ".java", ".kt", ".kts", ".scala", ".go", ".rs",
+         ".swift", ".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".dart", ".scss", ".less"],
+        [_SLASH_COMMENT, _C_BLOCK_COMMENT]
+    ),
+    ".php": [_HASH_COMMENT, _SLASH_COMMENT, _C_BLOCK_COMMENT],
+    ".css": [_C_BLOCK_COMMENT],
+    **dict.fromkeys([".sql", ".lua", ".hs"], [_DASH_COMMENT]),
+    **dict.fromkeys([".html", ".htm", ".xml", ".svg"], [_HTML_COMMENT]),
+}
+_COMMENT_SYNTAX_BY_FILENAME = {
+    "Dockerfile": [_HASH_COMMENT],
+    "Makefile": [_HASH_COMMENT],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def comment_line_re(file_path: str) -> Optional[Pattern[str]]:
+    """Regex matching full-line comments for the file's language, or None if the language is unknown"""
+    file_name = os.path.basename(file_path)
+    syntaxes = (
+        _COMMENT_SYNTAX_BY_FILENAME.get(file_name) or
+        _COMMENT_SYNTAX_BY_EXTENSION.get(os.path.splitext(file_name)[1].lower())
     )
+    if not syntaxes:
+        return None
+    return re.compile(r"^\s*(?:" + "|".join(syntaxes) + ")")
+
+
+def is_trivial_hunk(hunk: HunkContext) -> bool:
+    """Check if a hunk only deletes code, adds blank lines or comments, or fixes trailing whitespace"""
+    comment_re = comment_line_re(hunk.file_path)
+    added = []
+    # Runs of removed/added lines between context lines, compared in order
+    change_blocks: List[Tuple[List[str], List[str]]] = [([], [])]
+    for line in hunk.hunk_content.splitlines():
+        if line.startswith("+"):
+            added.append(line[1:])
+            change_blocks[-1][1].append(line[1:].rstrip())
+        elif line.startswith("-"):
+            change_blocks[-1][0].append(line[1:].rstrip())
+        elif not line.startswith("\\"):  # "\ No newline at end of file" does not split a change
+            change_blocks.append(([], []))
+
+    meaningful = [line for line in added if line.strip() and not (comment_re and comment_re.match(line))]
+    if not meaningful:
+        return True
+
+    # Trailing-whitespace fixes: every changed line comes back identical apart from trailing whitespace
+    return all(removed == added_lines for removed, added_lines in change_blocks)
 
-    # Add language instruction
-    prompt += f"\n\n# OUTPUT FORMAT\n"
-    prompt += f"Return your analysis as a structured JSON matching the ReviewResult schema.\n"
-    prompt += f"Always respond in {language} language for the review comments.\n"
-    prompt += f"File being reviewed: {hunk_context.file_path}\n"
 
-    return prompt
+def is_retryable_error(error: Exception) -> bool:
+    """Check if an AI call failure is transient (timeout, rate limit or server error)"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if isinstance(error, ModelHTTPError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
 
+async def run_agent_with_retry(agent: Agent[ReviewResult], prompt: str, cfg: BatchConfig) -> ReviewResult:
+    """Run the agent with a per-call timeout and exponential backoff on transient errors"""
+    for attempt in range(cfg.retries):
+        try:
+            result = await asyncio.wait_for(agent.run(prompt), cfg.timeout)
+            return result.output
+        except Exception as e:
+            if not is_retryable_error(e) or attempt == cfg.retries - 1:
+                raise
+            delay = 2 ** attempt
+            print(f"Retrying AI call in {delay}s after error: {e!r}")
+            await asyncio.sleep(delay)
 
-def should_exclude_file(file_path: str, exclude_patterns: List[str]) -> bool:
-    """Check if file should be excluded based on patterns"""
-    return any(fnmatch.fnmatch(file_path, pattern) for pattern in exclude_patterns)
+    raise RuntimeError("AI call retries exhausted")
 
 
-def filter_hunks_by_file(hunks: List[HunkContext], exclude_patterns: List[str]) -> List[HunkContext]:
-    """Filter out hunks from excluded files"""
-    filtered = []
-    excluded_files = set()
+def build_comments(hunk: HunkContext, reviews: List[ReviewItem]) -> List[Dict[str, Any]]:
+    """Convert review items for a hunk into GitHub review comments"""
+    review_comments = []
 
-    for hunk in hunks:
-        if should_exclude_file(hunk.file_path, exclude_patterns):
-            excluded_files.add(hunk.file_path)
+    for item in reviews:
+        if item.line_number < 1 or item.line_number > hunk.line_count:
+            print(f"Warning: line_number {item.line_number} out of range for hunk with {hunk.line_count} lines")
+            continue
+
+        # Calculate actual GitHub position
+        position = hunk.start_position + (item.line_number - 1)
+
+        review_comments.append(
+            {
+                "path": hunk.file_path,
+                "position": position,
+                "body": f"**[{item.severity.upper()}]** {item.review_comment}",
+                "_severity": item.severity.lower()
+            })
+
+    return review_comments
+
+
+def merge_review_items(reviews: List[ReviewItem]) -> List[ReviewItem]:
+    """Merge review items on the same line with the same severity, joining their comments"""
+    merged: Dict[Tuple[int, str], ReviewItem] = {}
+    for item in reviews:
+        key = (item.line_number, item.severity.lower())
+        if key in merged:
+            existing = merged[key]
+            merged[key] = existing.model_copy(
+                update={"review_comment": f"{existing.review_comment}\n\n{item.review_comment}"})
         else:
-            filtered.append(hunk)
+            merged[key] = item
+    return list(merged.values())
+
 
-    for file in excluded_files:
-        print(f"Excluded file: {file}")
+async def review_batch(
+    agents: List[Tuple[str, Agent[ReviewResult]]],
+    batch: List[HunkContext],
+    pr_details: PRDetails,
+    language: str,
+    cfg: BatchConfig,
+    sem: asyncio.Semaphore
+) -> Tuple[List[List[ReviewItem]], bool]:
+    """Review a batch of hunks with every agent in parallel, returning per-hunk items and whether all succeeded"""
+    files = ", ".join(dict.fromkeys(hunk.file_path for hunk in batch))
+
+    async def run_role(role: str, agent: Agent[ReviewResult]) -> ReviewResult:
+        prompt = build_prompt(pr_details, batch, language, role)
+        async with sem:
+            print(f"Analyzing {len(batch)} hunk(s) from {files} ({role})...")
+            return await run_agent_with_retry(agent, prompt, cfg)
+
+    results = await asyncio.gather(*[run_role(role, agent) for role, agent in agents], return_exceptions=True)
+
+    # Only fail the batch when no reviewer succeeded
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if len(errors) == len(results):
+        raise errors[0]
+
+    # Split review items back out to the hunks they refer to
+    reviews_per_hunk: List[List[ReviewItem]] = [[] for _ in batch]
+    for (role, _), review_result in zip(agents, results):
+        if isinstance(review_result, BaseException):
+            print(f"Error from {role} reviewer on {files}: {review_result}")
+            continue
+
+        # Log summary if provided
+        if review_result.summary:
+            print(f"Summary ({role}): {review_result.summary}")
+
+        for item in review_result.reviews:
+            if item.hunk_index < 1 or item.hunk_index > len(batch):
+                print(f"Warning: hunk_index {item.hunk_index} out of range for batch with {len(batch)} hunks")
+                continue
+            reviews_per_hunk[item.hunk_index - 1].append(item.model_copy(update={"hunk_index": 1}))
 
-    return filtered
+    return [merge_review_items(hunk_reviews) for hunk_reviews in reviews_per_hunk], not errors
 
 
-def analyze_hunks(
-    agent: Agent[ReviewResult],
+async def analyze_hunks(
+    agents: List[Tuple[str, Agent[ReviewResult]]],
     hunks: List[HunkContext],
     pr_details: PRDetails,
-    language: str
+    language: str,
+    cfg: Optional[BatchConfig] = None,
+    cache: Optional[ReviewCache] = None
 ) -> List[Dict[str, Any]]:
-    """Analyze code hunks and generate review comments"""
+    """Analyze code hunks concurrently and generate review comments"""
+    cfg = cfg or BatchConfig()
+
+    # Review items per hunk, aligned with the input hunks so comment order stays stable
+    reviews: List[Optional[List[ReviewItem]]] = [None] * len(hunks)
+
+    # Hunks without reviewable additions never reach the AI
+    for index, hunk in enumerate(hunks):
+        if is_trivial_hunk(hunk):
+            print(f"Skipping {hunk.file_path} (position {hunk.start_position}): no reviewable additions")
+            reviews[index] = []
+    reviewable = [index for index, known in enumerate(reviews) if known is None]
+
+    if cache:
+        for index in reviewable:
+            reviews[index] = cache.get(hunks[index])
+    pending = [index for index in reviewable if reviews[index] is None]
+    if cache:
+        print(f"♻️ Reusing cached reviews for {len(reviewable) - len(pending)} hunk(s)")
+
+    # Pack small hunks together so they share one prompt prefix and round trip
+    batches = pack_hunks([hunks[index] for index in pending], cfg.max_batch_tokens)
+    print(f"📦 Packed {len(pending)} hunk(s) into {len(batches)} AI request(s)")
+
+    # Bound in-flight AI calls to stay within provider rate limits
+    sem = asyncio.Semaphore(cfg.max_concurrent)
+    tasks = [review_batch(agents, batch, pr_details, language, cfg, sem) for batch in batches]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    pending_iter = iter(pending)
+    for batch, result in zip(batches, results):
+        indices = [next(pending_iter) for _ in batch]
+        if isinstance(result, BaseException):
+            files = ", ".join(dict.fromkeys(hunk.file_path for hunk in batch))
+            print(f"Error analyzing {files}: {result}")
+            continue
+        batch_reviews, complete = result
+        for index, hunk, new_reviews in zip(indices, batch, batch_reviews):
+            reviews[index] = new_reviews
+            # A partial result would hide the failed reviewers' findings from later runs
+            if cache and complete:
+                cache.set(hunk, new_reviews)
+
     review_comments = []
+    for hunk, final_reviews in zip(hunks, reviews):
+        if final_reviews:
+            review_comments.extend(build_comments(hunk, final_reviews))
 
-    for hunk in hunks:
-        prompt = build_prompt(pr_details, hunk, language)
+    return review_comments
 
-        try:
-            print(f"Analyzing {hunk.file_path} (position {hunk.start_position})...")
-            result = agent.run_sync(prompt)
-            review_result: ReviewResult = result.output
 
-            # Log summary if provided
-            if review_result.summary:
-                print(f"Summary: {review_result.summary}")
+def build_review_body(comments: List[Dict[str, Any]]) -> str:
+    """Build the review summary body from the comments"""
+    # Group comments by severity for summary
+    severity_counts = {"critical": 0, "warning": 0, "suggestion": 0}
+    for comment in comments:
+        severity = comment.get("_severity")
+        if severity in severity_counts:
+            severity_counts[severity] += 1
 
-            # Process review items
-            for item in review_result.reviews:
-                # Calculate actual GitHub position
-                hunk_lines = hunk.hunk_content.splitlines()
+    # Build review summary
+    summary_parts = []
+    if severity_counts["critical"] > 0:
+        summary_parts.append(f"🚨 {severity_counts['critical']} critical issue(s)")
+    if severity_counts["warning"] > 0:
+        summary_parts.append(f"⚠️ {severity_counts['warning']} warning(s)")
+    if severity_counts["suggestion"] > 0:
+        summary_parts.append(f"💡 {severity_counts['suggestion']} suggestion(s)")
 
-                if item.line_number < 1 or item.line_number > len(hunk_lines):
-                    print(f"Warning: line_number {item.line_number} out of range for hunk with {len(hunk_lines)} lines")
-                    continue
+    review_body = f"## AI Code Review\n\n"
+    if summary_parts:
+        review_body += "Found: " + ", ".join(summary_parts) + "\n\n"
+    review_body += f"Reviewed {len(set(c['path'] for c in comments))} file(s) with {len(comments)} comment(s)."
+    return review_body
 
-                position = hunk.start_position + (item.line_number - 1)
 
-                review_comments.append(
-                    {
-                        "path": hunk.file_path,
-                        "position": position,
-                        "body": f"**[{item.severity.upper()}]** {item.review_comment}"
-                    })
+def build_fallback_body(comments: List[Dict[str, Any]]) -> str:
+    """Build an issue comment body listing comments that could not be posted inline"""
+    fallback_body = "## AI Code Review (Fallback)\n\n"
+    fallback_body += "Unable to create inline comments. Summary:\n\n"
 
-        except Exception as e:
-            print(f"Error analyzing {hunk.file_path}: {e}")
-            continue
+    # Group by file
+    by_file = {}
+    for comment in comments:
+        by_file.setdefault(comment['path'], []).append(comment)
 
-    return review_comments
+    for file_path, file_comments in by_file.items():
+        fallback_body += f"### `{file_path}`\n"
+        for comment in file_comments:
+            fallback_body += f"- Line ~{comment['position']}: {comment['body']}\n"
+        fallback_body += "\n"
+
+    return fallback_body
 
 
-def submit_review(
+async def submit_review(
     gh: Github,
     pr_details: PRDetails,
     comments: List[Dict[str, Any]]
 ) -> bool:
-    """Submit review comments to GitHub"""
+    """Submit review comments to GitHub, split into reviews posted one after another"""
     if not comments:
         print("No review comments to submit.")
         return True
 
-    try:
-        repo = gh.get_repo(f"{pr_details.owner}/{pr_details.repo}")
-        pr = repo.get_pull(pr_details.pull_number)
-
-        # Group comments by severity for summary
-        severity_counts = {"critical": 0, "warning": 0, "suggestion": 0}
-        for comment in comments:
-            body = comment.get("body", "")
-            for severity in severity_counts:
-                if f"[{severity.upper()}]" in body:
-                    severity_counts[severity] += 1
-                    break
-
-        # Build review summary
-        summary_parts = []
-        if severity_counts["critical"] > 0:
-            summary_parts.append(f"🚨 {severity_counts['critical']} critical issue(s)")
-        if severity_counts["warning"] > 0:
-            summary_parts.append(f"⚠️ {severity_counts['warning']} warning(s)")
-        if severity_counts["suggestion"] > 0:
-            summary_parts.append(f"💡 {severity_counts['suggestion']} suggestion(s)")
-
-        review_body = f"## AI Code Review\n\n"
-        if summary_parts:
-            review_body += "Found: " + ", ".join(summary_parts) + "\n\n"
-        review_body += f"Reviewed {len(set(c['path'] for c in comments))} file(s) with {len(comments)} comment(s)."
-
-        # Submit review
-        pr.create_review(
-            body=review_body,
-            comments=comments,
-            event="COMMENT"
-        )
-
-        print(f"✅ Submitted review with {len(comments)} comment(s)")
-        return True
+    repo_name = f"{pr_details.owner}/{pr_details.repo}"
 
+    try:
+        pr = get_pull(gh, repo_name, pr_details.pull_number)
     except GithubException as e:
         print(f"❌ Failed to submit review: {e}")
+        failed = comments
+    else:
+        # Chunk comments so a rejected review only loses its own chunk. GitHub asks for content-creating
+        # requests to be made one at a time, so chunks are posted in order; the first one carries the summary.
+        chunks = [comments[i:i + REVIEW_CHUNK_SIZE] for i in range(0, len(comments), REVIEW_CHUNK_SIZE)]
+        posted: List[Dict[str, Any]] = []
+        failed = []
+        summary_review = None
+
+        for index, chunk in enumerate(chunks, 1):
+            if summary_review is None:
+                review_body = build_review_body(comments)
+            else:
+                review_body = f"## AI Code Review (part {index}/{len(chunks)})"
+            try:
+                review = await asyncio.to_thread(
+                    pr.create_review,
+                    body=review_body,
+                    comments=[{key: value for key, value in c.items() if key != "_severity"} for c in chunk],
+                    event="COMMENT"
+                )
+            except Exception as e:
+                print(f"❌ Failed to submit review part {index}/{len(chunks)}: {e}")
+                failed.extend(chunk)
+                continue
+
+            posted.extend(chunk)
+            if summary_review is None:
+                summary_review = review
+
+        if posted:
+            print(f"✅ Submitted review with {len(posted)} comment(s)")
+        if not failed:
+            return True
 
-        # Fallback: post as issue comment
-        try:
-            repo = gh.get_repo(f"{pr_details.owner}/{pr_details.repo}")
-            pr = repo.get_pull(pr_details.pull_number)
-
-            fallback_body = "## AI Code Review (Fallback)\n\n"
-            fallback_body += "Unable to create inline comments. Summary:\n\n"
-
-            # Group by file
-            by_file = {}
-            for comment in comments:
-                by_file.setdefault(comment['path'], []).append(comment)
-
-            for file_path, file_comments in by_file.items():
-                fallback_body += f"### `{file_path}`\n"
-                for comment in file_comments:
-                    fallback_body += f"- Line ~{comment['position']}: {comment['body']}\n"
-                fallback_body += "\n"
+        # The summary was written before later chunks failed; only count the comments posted inline
+        if summary_review is not None:
+            try:
+                await asyncio.to_thread(summary_review.edit, build_review_body(posted))
+            except Exception as e:
+                print(f"⚠️ Failed to update review summary: {e}")
 
-            pr.create_issue_comment(fallback_body)
-            print("✅ Posted fallback comment")
-            return True
+    # Fallback: post comments that could not be submitted inline as an issue comment
+    try:
+        pr = get_pull(gh, repo_name, pr_details.pull_number)
+        pr.create_issue_comment(build_fallback_body(failed))
+        print("✅ Posted fallback comment")
+        return True
 
-        except Exception as e2:
-            print(f"❌ Fallback also failed: {e2}")
-            return False
+    except Exception as e2:
+        print(f"❌ Fallback also failed: {e2}")
+        return False
 
 
-def main():
-    """Main entry point for the reviewer"""
+async def amain():
+    """Async entry point for the reviewer"""
     # Validate required inputs
     if not github_token:
         print("❌ Missing GitHub token (GITHUB_TOKEN)")
@@ -412,11 +884,15 @@ def main():
     # Parse exclude patterns
     exclude_raw = os.environ.get("INPUT_EXCLUDE", "").strip()
     exclude_patterns = [p.strip() for p in exclude_raw.split(",") if p.strip()] if exclude_raw else []
+    exclude_re = compile_exclude_patterns(exclude_patterns)
 
     print(f"🚀 AI Code Reviewer starting...")
     print(f"📦 Repository: {repo_full_name}")
-    print(f"🤖 Model: {model_name}")
+    model_roles = parse_model_roles(models_spec, model_name)
+    print(f"🤖 Model(s): {', '.join(f'{role}={model}' for role, model in model_roles)}")
     print(f"🌍 Language: {language}")
+    print(f"⚡ Max concurrent AI calls: {max_concurrent}")
+    print(f"🔌 HTTP/2: {'enabled' if use_http2 else 'disabled'}")
     if exclude_patterns:
         print(f"🚫 Exclude patterns: {exclude_patterns}")
 
@@ -430,32 +906,30 @@ def main():
 
         print(f"🔍 Reviewing PR #{pr_details.pull_number}: {pr_details.title}")
 
-        # Get diff
-        diff_text = get_pr_diff(gh, pr_details)
-        if not diff_text:
-            print("⚠️ No diff found")
-            return 0
-
-        # Parse diff into hunks
-        all_hunks = parse_diff_with_positions(diff_text)
-        print(f"📄 Found {len(all_hunks)} hunk(s) to review")
-
-        # Filter excluded files
-        hunks_to_review = filter_hunks_by_file(all_hunks, exclude_patterns)
-        print(f"📝 Reviewing {len(hunks_to_review)} hunk(s) after filtering")
+        # Get diff and parse it into hunks
+        hunks_to_review = await load_pr_hunks(gh, pr_details, exclude_re)
 
         if not hunks_to_review:
             print("✅ No hunks to review after filtering")
             return 0
 
-        # Build AI agent
-        agent = build_ai_agent(api_key, base_url, model_name)
+        print(f"📝 Reviewing {len(hunks_to_review)} hunk(s) after filtering")
+
+        batch_config = BatchConfig(max_concurrent=max_concurrent, max_batch_tokens=batch_tokens)
+
+        # One client for all AI calls, so concurrent requests share (and with HTTP/2 multiplex) connections
+        llm_timeout = httpx.Timeout(batch_config.timeout, connect=5)
+        async with httpx.AsyncClient(http2=use_http2, timeout=llm_timeout) as llm_client:
+            # Build AI agents, one per review role
+            agents = build_ai_agents(api_key, base_url, model_roles, http_client=llm_client)
 
-        # Analyze code
-        comments = analyze_hunks(agent, hunks_to_review, pr_details, language)
+            # Analyze code
+            models_key = ",".join(f"{role}:{model}" for role, model in model_roles)
+            cache = ReviewCache(cache_dir, models_key, language) if cache_dir else None
+            comments = await analyze_hunks(agents, hunks_to_review, pr_details, language, batch_config, cache)
 
         # Submit review
-        if submit_review(gh, pr_details, comments):
+        if await submit_review(gh, pr_details, comments):
             return 0
         else:
             return 1
@@ -467,6 +941,11 @@ def main():
         return 1
 
 
+def main():
+    """Main entry point for the reviewer"""
+    return asyncio.run(amain())
+
+
 if __name__ == "__main__":
     import sys
 
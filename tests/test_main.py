@@ -0,0 +1,449 @@
+import asyncio
+import gzip
+import json
+import threading
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+import httpx
+import pytest
+from github import GithubException
+from pydantic import ValidationError
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelResponse,
+    ToolCallPart,
+)
+from pydantic_ai.models.function import (
+    AgentInfo,
+    FunctionModel,
+)
+
+from unidiff import PatchSet
+
+from reviewer import main
+from reviewer.main import (
+    BatchConfig,
+    HunkContext,
+    PRDetails,
+    ReviewCache,
+    ReviewItem,
+    ReviewResult,
+    analyze_hunks,
+    build_github_client,
+    compile_exclude_patterns,
+    get_pr_diff,
+    get_pr_diff_async,
+    is_trivial_hunk,
+    pack_hunks,
+    parse_diff_manual,
+    parse_diff_with_positions,
+)
+
+DIFF = b"""diff --git a/src/app.py b/src/app.py
+--- a/src/app.py
++++ b/src/app.py
+@@ -1,3 +1,3 @@
+ x = 1
+-y = 2
++y = 3
+ z = 4
+"""
+
+PR_DETAILS = PRDetails(owner="owner", repo="repo", pull_number=7, title="Title", description=None)
+
+
+def fetch_diff(handler):
+    async def run():
+        async with build_github_client(transport=httpx.MockTransport(handler)) as client:
+            return await get_pr_diff_async(client, PR_DETAILS)
+
+    return asyncio.run(run())
+
+
+def test_get_pr_diff_async_parses_diff():
+    requested = []
+
+    def handler(request):
+        requested.append(str(request.url))
+        return httpx.Response(200, content=DIFF)
+
+    hunks = parse_diff_with_positions(fetch_diff(handler))
+
+    assert requested == ["https://api.github.com/repos/owner/repo/pulls/7.diff"]
+    assert len(hunks) == 1
+    assert hunks[0].file_path == "src/app.py"
+    assert hunks[0].hunk_content == " x = 1\n-y = 2\n+y = 3\n z = 4\n"
+    assert hunks[0].line_count == 4
+
+
+
+class DiffHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = DIFF
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        if self.path == "/gzip":
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        if self.path == "/chunked":
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(body), 7):
+                chunk = body[i:i + 7]
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def diff_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DiffHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("path", ["/plain", "/gzip", "/chunked"])
+def test_get_pr_diff_streams_real_response(diff_server, monkeypatch, path):
+    monkeypatch.setattr(main, "get_pr_diff_url", lambda pr_details: diff_server + path)
+
+    hunks = parse_diff_with_positions(get_pr_diff(None, PR_DETAILS))
+
+    assert [(h.file_path, h.start_position, h.line_count) for h in hunks] == [("src/app.py", 2, 4)]
+    assert hunks[0].hunk_content == " x = 1\n-y = 2\n+y = 3\n z = 4\n"
+
+
+def test_get_pr_diff_async_follows_redirects():
+    def handler(request):
+        if request.url.path == "/repos/owner/repo/pulls/7.diff":
+            return httpx.Response(301, headers={"Location": "https://api.github.com/repositories/1/pulls/7.diff"})
+        return httpx.Response(200, content=DIFF)
+
+    hunks = parse_diff_with_positions(fetch_diff(handler))
+
+    assert [h.file_path for h in hunks] == ["src/app.py"]
+
+
+def test_get_pr_diff_async_raises_on_error_status():
+    def handler(request):
+        return httpx.Response(404, text="Not Found")
+
+    with pytest.raises(RuntimeError, match="Status: 404"):
+        fetch_diff(handler)
+
+
+@pytest.mark.parametrize(
+    "file_path, hunk_content, expected",
+    [
+        ("app.py", " a\n-b\n c\n", True),
+        ("app.py", " a\n+\n+   \n", True),
+        ("app.py", " a\n+# note\n", True),
+        ("app.c", "+// note\n+/* block */\n+/* open\n+ */\n", True),
+        ("app.py", "-x = 1  \n+x = 1\n y\n", True),
+        ("docker/Dockerfile", "+# note\n", True),
+        ("app.py", " if x:\n-    delete_all()\n+delete_all()\n", False),
+        ("app.py", "-a = load()\n-validate(a)\n+validate(a)\n+a = load()\n", False),
+        ("app.py", " x\n-a\n b\n+a\n", False),
+        ("app.py", '-s = "a b"\n+s = "ab"\n', False),
+        ("app.py", "-not x\n+notx\n", False),
+        ("lib.rs", "+#[derive(Debug)]\n", False),
+        ("style.css", "+#header { display: none }\n", False),
+        ("README.md", "+# Title\n+* item\n", False),
+        ("app.c", "+/* hi */ free(p);\n", False),
+        ("app.c", "+#include <stdio.h>\n", False),
+    ],
+)
+def test_is_trivial_hunk(file_path, hunk_content, expected):
+    hunk = HunkContext(file_path, hunk_content, 1, hunk_content.count("\n"))
+
+    assert is_trivial_hunk(hunk) is expected
+
+
+def test_review_cache_hit_miss_and_corrupt_file(tmp_path):
+    hunk = HunkContext("src/app.py", " x = 1\n+y = 3\n", 2, 2)
+    other = HunkContext("src/app.py", " x = 1\n+y = 4\n", 2, 2)
+    cache = ReviewCache(str(tmp_path / "cache"), "general:gpt-4o", "en")
+    reviews = [ReviewItem(hunk_index=1, line_number=2, review_comment="Check y", severity="warning")]
+
+    assert cache.get(hunk) is None
+
+    cache.set(hunk, reviews)
+    assert cache.get(hunk) == reviews
+    assert cache.get(other) is None
+    # The key covers the model(s) and language, not just the hunk content
+    assert ReviewCache(str(tmp_path / "cache"), "general:gpt-4o-mini", "en").get(hunk) is None
+    assert ReviewCache(str(tmp_path / "cache"), "general:gpt-4o", "zh").get(hunk) is None
+
+    (cache_file,) = (tmp_path / "cache").iterdir()
+    cache_file.write_text("{not json", encoding="utf-8")
+    assert cache.get(hunk) is None
+
+
+def test_analyze_hunks_does_not_cache_partial_results(tmp_path):
+    def review(messages, info: AgentInfo):
+        args = {"reviews": [{"hunk_index": 1, "line_number": 3, "review_comment": "Check y", "severity": "warning"}]}
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, json.dumps(args))])
+
+    def fail(messages, info: AgentInfo):
+        raise RuntimeError("model unavailable")
+
+    hunk = HunkContext("src/app.py", " x = 1\n-y = 2\n+y = 3\n z = 4\n", 2, 4)
+    cache = ReviewCache(str(tmp_path), "security:a,logic:b", "en")
+    agents = [
+        ("security", Agent(FunctionModel(review), output_type=ReviewResult)),
+        ("logic", Agent(FunctionModel(fail), output_type=ReviewResult)),
+    ]
+
+    comments = asyncio.run(analyze_hunks(agents, [hunk], PR_DETAILS, "en", BatchConfig(retries=1), cache))
+
+    assert [c["position"] for c in comments] == [4]
+    assert cache.get(hunk) is None
+
+    agents[1] = ("logic", agents[0][1])
+    asyncio.run(analyze_hunks(agents, [hunk], PR_DETAILS, "en", BatchConfig(retries=1), cache))
+
+    assert cache.get(hunk) is not None
+
+
+def make_hunks(*sizes):
+    # Each hunk's content is 4 * size - 1 characters, i.e. `size` estimated tokens
+    return [HunkContext(f"src/f{i}.py", "+" + "a" * (4 * size - 3) + "\n", 1, 1) for i, size in enumerate(sizes)]
+
+
+def test_pack_hunks_respects_token_budget():
+    hunks = make_hunks(10, 10, 10, 50, 5)
+
+    batches = pack_hunks(hunks, 25)
+
+    # An oversized hunk gets a batch of its own rather than being dropped
+    assert [[h.file_path for h in batch] for batch in batches] == [
+        ["src/f0.py", "src/f1.py"], ["src/f2.py"], ["src/f3.py"], ["src/f4.py"]]
+
+
+def test_pack_hunks_zero_budget_sends_one_hunk_per_request():
+    hunks = make_hunks(1, 1, 1)
+
+    assert pack_hunks(hunks, 0) == [[hunk] for hunk in hunks]
+
+
+def test_analyze_hunks_maps_batched_comments_to_their_hunk():
+    prompts = []
+
+    def review(messages, info: AgentInfo):
+        prompts.append(messages[-1].parts[-1].content)
+        args = {"reviews": [
+            {"hunk_index": 2, "line_number": 2, "review_comment": "Check b", "severity": "warning"},
+            {"hunk_index": 3, "line_number": 1, "review_comment": "No such hunk", "severity": "error"},
+        ]}
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, json.dumps(args))])
+
+    hunks = [
+        HunkContext("src/a.py", " a = 1\n+a = 2\n", 2, 2),
+        HunkContext("src/b.py", " b = 1\n+b = 2\n", 9, 2),
+    ]
+    agents = [("general", Agent(FunctionModel(review), output_type=ReviewResult))]
+
+    comments = asyncio.run(analyze_hunks(agents, hunks, PR_DETAILS, "en", BatchConfig(retries=1)))
+
+    assert len(prompts) == 1
+    assert "## HUNK 1: src/a.py" in prompts[0] and "## HUNK 2: src/b.py" in prompts[0]
+    assert [(c["path"], c["position"]) for c in comments] == [("src/b.py", 10)]
+
+
+def test_load_pr_hunks_falls_back_on_non_utf8_diff(monkeypatch):
+    latin1_diff = DIFF.replace(b"y = 3", "y = 'é'".encode("latin-1"))
+    fetch_async = get_pr_diff_async
+
+    async def fake_get_pr_diff_async(client, pr_details):
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=latin1_diff))
+        async with httpx.AsyncClient(transport=transport) as mock_client:
+            return await fetch_async(mock_client, pr_details)
+
+    monkeypatch.setattr(main, "use_http2", True)
+    monkeypatch.setattr(main, "get_pr_diff_async", fake_get_pr_diff_async)
+    monkeypatch.setattr(main, "get_pr_diff_text", lambda gh, pr_details: latin1_diff.decode("utf-8", "replace"))
+
+    hunks = asyncio.run(main.load_pr_hunks(None, PR_DETAILS))
+
+    assert [(h.file_path, h.start_position, h.line_count) for h in hunks] == [("src/app.py", 2, 4)]
+    assert "+y = '�'" in hunks[0].hunk_content
+
+
+def test_review_item_requires_hunk_index():
+    with pytest.raises(ValidationError):
+        ReviewItem(line_number=1, review_comment="Check this")
+
+    schema = ReviewResult.model_json_schema()
+    assert "hunk_index" in schema["$defs"]["ReviewItem"]["required"]
+
+
+def test_load_pr_hunks_without_http2_streams_with_requests(diff_server, monkeypatch):
+    monkeypatch.setattr(main, "use_http2", False)
+    monkeypatch.setattr(main, "get_pr_diff_url", lambda pr_details: diff_server + "/chunked")
+
+    hunks = asyncio.run(main.load_pr_hunks(None, PR_DETAILS))
+
+    assert [(h.file_path, h.start_position, h.line_count) for h in hunks] == [("src/app.py", 2, 4)]
+
+
+PARITY_DIFF = """diff --git a/src/app.py b/src/app.py
+index 1111111..2222222 100644
+--- a/src/app.py
++++ b/src/app.py
+@@ -1,3 +1,3 @@
+ x = 1
+-y = 2
++y = 3
+ z = 4
+@@ -10,3 +10,3 @@
+ a = 1
+--- not a header
++++ b/not/a/header
+ c = 2
+diff --git a/gone.py b/gone.py
+deleted file mode 100644
+index 3333333..0000000
+--- a/gone.py
++++ /dev/null
+@@ -1,2 +0,0 @@
+-old = 1
+-older = 2
+diff --git a/new.py b/new.py
+new file mode 100644
+index 0000000..4444444
+--- /dev/null
++++ b/new.py
+@@ -0,0 +1,2 @@
++fresh = 1
++fresher = 2
+diff --git a/vendor/x.md b/vendor/x.md
+index 5555555..6666666 100644
+--- a/vendor/x.md
++++ b/vendor/x.md
+@@ -1,2 +1,3 @@
+ a
++++ b/src/evil.py
+ b
+@@ -10,2 +11,3 @@
+ c
++real
+ d
+diff --git a/tail.txt b/tail.txt
+index 7777777..8888888 100644
+--- a/tail.txt
++++ b/tail.txt
+@@ -1 +1 @@
+-a
+\\ No newline at end of file
++b
+\\ No newline at end of file
+"""
+
+
+def test_parse_diff_manual_matches_unidiff():
+    exclude_re = compile_exclude_patterns(["vendor/*"])
+
+    def summarize(hunks):
+        return [(h.file_path, h.start_position, h.line_count, h.hunk_content) for h in hunks]
+
+    manual = summarize(parse_diff_manual(PARITY_DIFF, exclude_re))
+    expected = summarize(parse_diff_with_positions(PatchSet(PARITY_DIFF), exclude_re))
+
+    assert manual == expected
+    assert [(path, position) for path, position, _, _ in manual] == [
+        ("src/app.py", 2),
+        ("src/app.py", 7),
+        ("gone.py", 2),
+        ("new.py", 2),
+        ("tail.txt", 2),
+    ]
+
+
+class FakeReview:
+    def __init__(self, body):
+        self.body = body
+
+    def edit(self, body):
+        self.body = body
+
+
+class FakePullRequest:
+    def __init__(self, failing_calls=()):
+        self.failing_calls = set(failing_calls)
+        self.reviews = []
+        self.issue_comments = []
+        self.calls = 0
+
+    def create_review(self, body, comments, event):
+        self.calls += 1
+        if self.calls in self.failing_calls:
+            raise GithubException(422, {"message": "Unprocessable"}, None)
+        assert all("_severity" not in comment for comment in comments)
+        review = FakeReview(body)
+        self.reviews.append((review, [comment["position"] for comment in comments]))
+        return review
+
+    def create_issue_comment(self, body):
+        self.issue_comments.append(body)
+
+
+def make_comments(count, severity="warning"):
+    return [
+        {"path": f"src/file{i % 3}.py", "position": i, "body": f"**[{severity.upper()}]** c{i}", "_severity": severity}
+        for i in range(1, count + 1)
+    ]
+
+
+def submit(pr, comments, monkeypatch):
+    monkeypatch.setitem(main._pull_cache, ("owner/repo", 7), pr)
+    return asyncio.run(main.submit_review(None, PR_DETAILS, comments))
+
+
+def test_submit_review_posts_chunks_in_order(monkeypatch):
+    pr = FakePullRequest()
+
+    assert submit(pr, make_comments(120), monkeypatch)
+
+    assert [len(positions) for _, positions in pr.reviews] == [50, 50, 20]
+    assert [positions[0] for _, positions in pr.reviews] == [1, 51, 101]
+    assert "⚠️ 120 warning(s)" in pr.reviews[0][0].body
+    assert [review.body for review, _ in pr.reviews[1:]] == [
+        "## AI Code Review (part 2/3)", "## AI Code Review (part 3/3)"
+    ]
+    assert pr.issue_comments == []
+
+
+def test_submit_review_falls_back_for_failed_chunks_only(monkeypatch):
+    pr = FakePullRequest(failing_calls={2})
+
+    assert submit(pr, make_comments(120), monkeypatch)
+
+    assert [positions[0] for _, positions in pr.reviews] == [1, 101]
+    # The summary only counts comments that were posted inline
+    assert "⚠️ 70 warning(s)" in pr.reviews[0][0].body
+    assert "70 comment(s)" in pr.reviews[0][0].body
+    assert len(pr.issue_comments) == 1
+    assert pr.issue_comments[0].count("- Line ~") == 50
+    assert "- Line ~51:" in pr.issue_comments[0]
+
+
+def test_submit_review_moves_summary_when_first_chunk_fails(monkeypatch):
+    pr = FakePullRequest(failing_calls={1})
+
+    assert submit(pr, make_comments(60), monkeypatch)
+
+    assert len(pr.reviews) == 1
+    summary, positions = pr.reviews[0]
+    assert positions[0] == 51
+    assert "⚠️ 10 warning(s)" in summary.body
+    assert pr.issue_comments[0].count("- Line ~") == 50